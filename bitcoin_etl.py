@@ -0,0 +1,456 @@
+import datetime
+import json
+import math
+import queue
+import sqlite3
+import threading
+from collections import deque
+from typing import Optional
+
+import websocket
+
+from bitcoin_price import WEBSOCKET_URL
+from etl_system import ETL, Message, Source, Sink, SQLiteSink
+
+class Trade(Message):
+    '''
+    A class to represent a single trade received from the exchange.
+
+    Attributes
+    ----------
+    key : str
+        The symbol that was traded.
+    value : float
+        The price of the trade.
+    ts : datetime
+        The timestamp of the trade.
+    volume : float
+        The traded volume.
+    '''
+
+    def __init__(
+            self,
+            key: str,
+            value: float,
+            ts: datetime.datetime,
+            volume: float
+        ) -> None:
+        super().__init__(key, value, ts)
+        self.volume = volume
+
+    def __repr__(self) -> str:
+        class_name = type(self).__name__
+        return '{}({!r}, {!r}, {!r}, {!r})'.format(class_name, self.key, self.value, self.ts, self.volume)
+
+    def __str__(self):
+        return f'{self.ts.strftime("%Y-%m-%d %H:%M:%S")} price:{self.value} volume:{self.volume}'
+
+class Bar(Message):
+    '''
+    A class to represent a closed one minute bar of trades.
+
+    The value of the message is the Volume Weighted Average Price of the trades in the bar.
+
+    Attributes
+    ----------
+    key : str
+        The symbol that was traded.
+    value : float
+        The Volume Weighted Average Price of the trades.
+    ts : datetime
+        The start of the minute covered by the bar.
+    open, high, low, close : float
+        The first, highest, lowest and last price of the trades.
+    volume : float
+        The total traded volume.
+    trade_count : int
+        The number of trades in the bar.
+    '''
+
+    def __init__(
+            self,
+            key: str,
+            value: float,
+            ts: datetime.datetime,
+            open: float,
+            high: float,
+            low: float,
+            close: float,
+            volume: float,
+            trade_count: int
+        ) -> None:
+        super().__init__(key, value, ts)
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.trade_count = trade_count
+
+    def __repr__(self) -> str:
+        class_name = type(self).__name__
+        return '{}({!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r})'.format(
+            class_name, self.key, self.value, self.ts, self.open, self.high, self.low, self.close, self.volume, self.trade_count)
+
+    def __str__(self):
+        return (f'{self.key} {self.ts.strftime("%H:%M")} VWAP:{round(self.value, 2)} '
+                f'O:{self.open} H:{self.high} L:{self.low} C:{self.close} V:{self.volume} N:{self.trade_count}')
+
+class BarAggregator:
+    '''
+    A class that aggregates trades into one minute bars.
+
+    Trades may arrive late and out of order, so a minute is only closed once a trade that is
+    more than grace_seconds past the end of that minute has been seen. Trades for minutes that
+    are already closed are counted in late_trades and dropped.
+
+    Attributes
+    ----------
+    grace_seconds : int
+        How long to wait after the end of a minute before closing it.
+    late_trades : int
+        The number of trades dropped because their minute was already closed.
+
+    Methods
+    -------
+    add(self, trade: Trade) -> list[Bar]:
+        Adds a trade and returns the bars closed by it.
+    flush(self) -> list[Bar]:
+        Closes and returns all open bars.
+    has_open_bars(self) -> bool:
+        Returns True if there are bars which are not closed yet.
+    '''
+
+    def __init__(self, grace_seconds: int = 10) -> None:
+        self.grace_seconds = grace_seconds
+        self.late_trades = 0
+        # Open bars keyed by (symbol, minute since epoch)
+        self._open_bars = {}
+        self._watermark_ms = None
+        self._closed_minute = None
+
+    def add(self, trade: Trade) -> list[Bar]:
+        '''Adds a trade and returns the bars closed by it.'''
+        timestamp_ms = int(trade.ts.timestamp() * 1000)
+        minute = timestamp_ms // 60000
+
+        if self._closed_minute is not None and minute <= self._closed_minute:
+            self.late_trades += 1
+            return []
+
+        price = float(trade.value)
+        volume = float(trade.volume)
+        bar_key = (trade.key, minute)
+        bar = self._open_bars.get(bar_key)
+
+        # Each bar is kept as [first_ts, open, last_ts, close, high, low, volume, volume * price, count]
+        # so that open and close follow the trade timestamps even if trades arrive out of order
+        if bar is None:
+            self._open_bars[bar_key] = [timestamp_ms, price, timestamp_ms, price, price, price, volume, volume * price, 1]
+        else:
+            if timestamp_ms < bar[0]:
+                bar[0], bar[1] = timestamp_ms, price
+            if timestamp_ms >= bar[2]:
+                bar[2], bar[3] = timestamp_ms, price
+            bar[4] = max(bar[4], price)
+            bar[5] = min(bar[5], price)
+            bar[6] += volume
+            bar[7] += volume * price
+            bar[8] += 1
+
+        if self._watermark_ms is None or timestamp_ms > self._watermark_ms:
+            self._watermark_ms = timestamp_ms
+
+        # Close every minute that ended more than grace_seconds before the newest trade
+        last_closable = (self._watermark_ms - self.grace_seconds * 1000) // 60000 - 1
+        return self._close(last_closable)
+
+    def flush(self) -> list[Bar]:
+        '''Closes and returns all open bars.'''
+        if not self._open_bars:
+            return []
+        return self._close(max(minute for _, minute in self._open_bars))
+
+    def has_open_bars(self) -> bool:
+        '''Returns True if there are bars which are not closed yet.'''
+        return bool(self._open_bars)
+
+    def _close(self, last_minute: int) -> list[Bar]:
+        '''Closes all open bars up to and including last_minute and returns them ordered by time.'''
+        if self._closed_minute is not None and last_minute <= self._closed_minute:
+            return []
+
+        closed_keys = sorted((key for key in self._open_bars if key[1] <= last_minute), key=lambda key: (key[1], key[0]))
+        self._closed_minute = last_minute
+
+        bars = []
+        for key in closed_keys:
+            _, open_price, _, close_price, high, low, volume, volume_price, count = self._open_bars.pop(key)
+            symbol, minute = key
+            ts = datetime.datetime.fromtimestamp(minute * 60).astimezone()
+            vwa_price = volume_price / volume if volume else close_price
+            bars.append(Bar(symbol, vwa_price, ts, open_price, high, low, close_price, volume, count))
+        return bars
+
+class TradeSource(Source):
+    '''
+    A class that reads trades from the finnhub.io websockets API.
+
+    Messages received by the websocket are parsed into Trade objects and put in a queue which is
+    read by read_message. The feed method can be used to replay recorded messages without a websocket.
+
+    Attributes
+    ----------
+    name : str
+        A name used to identify the source.
+    symbol : str
+        The symbol to subscribe to.
+    url : str
+        The websocket url.
+
+    Methods
+    -------
+    start(self) -> Self:
+        Opens the websocket in a background thread. The stream is closed when the websocket disconnects.
+    feed(self, message: str) -> None:
+        Parses a json message and puts its trades in the queue.
+    close(self) -> None:
+        Marks the end of the stream.
+    read_message(self, timeout: Optional[float] = None) -> Optional[Trade]:
+        Returns the next trade, blocking until one is available.
+    has_message(self) -> bool:
+        Returns True until the stream is closed and all trades are read.
+    '''
+
+    def __init__(self, name: str, symbol: str = 'BINANCE:BTCUSDT', url: str = WEBSOCKET_URL) -> None:
+        super().__init__(name)
+        self.infinite_flag = True
+        self.symbol = symbol
+        self.url = url
+        self._queue = queue.Queue()
+        self._closed = False
+        self._ws = None
+
+    def start(self) -> 'TradeSource':
+        '''Opens the websocket in a background thread. The stream is closed when the websocket disconnects.'''
+        self._ws = websocket.WebSocketApp(self.url,
+                                          on_message = lambda ws, message: self.feed(message),
+                                          on_error = self._on_error,
+                                          on_close = self._on_close)
+        self._ws.on_open = lambda ws: ws.send(json.dumps({'type': 'subscribe', 'symbol': self.symbol}))
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self) -> None:
+        '''Runs the websocket until it disconnects and then closes the stream, so that readers don't wait forever.'''
+        try:
+            self._ws.run_forever()
+        finally:
+            self.close()
+
+    def _on_error(self, ws: websocket.WebSocketApp, error: Exception) -> None:
+        print(error)
+        self.close()
+
+    def _on_close(self, ws: websocket.WebSocketApp, status: Optional[int], msg: Optional[str]) -> None:
+        print("### closed ###")
+        self.close()
+
+    def feed(self, message: str) -> None:
+        '''Parses a json message and puts its trades in the queue. Messages without trade data (e.g. pings) are ignored.'''
+        payload = json.loads(message)
+
+        for trade in payload.get('data') or []:
+            ts = datetime.datetime.fromtimestamp(int(trade['t']) / 1000).astimezone()
+            self._queue.put(Trade(trade.get('s', self.symbol), trade['p'], ts, trade['v']))
+
+    def close(self) -> None:
+        '''Marks the end of the stream and closes the websocket if it was opened. Closing twice has no effect.'''
+        if self._closed:
+            return
+        self._closed = True
+        self.infinite_flag = False
+        self._queue.put(None)
+        if self._ws:
+            self._ws.close()
+
+    def read_message(self, timeout: Optional[float] = None) -> Optional[Trade]:
+        '''Returns the next trade, blocking until one is available. Returns None if the stream is closed.'''
+        try:
+            trade = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if trade is None:
+            # Keep the end marker for any further reads
+            self._queue.put(None)
+        return trade
+
+    def has_message(self) -> bool:
+        '''Returns True until the stream is closed and all trades are read.'''
+        return not self._closed or self._queue.qsize() > 1
+
+class VWAPBarSource(Source):
+    '''
+    A class that turns a trade source into a source of closed one minute bars.
+
+    Attributes
+    ----------
+    name : str
+        A name used to identify the source.
+    trades : TradeSource
+        The source from which trades are read.
+    aggregator : BarAggregator
+        Aggregates the trades into bars.
+
+    Methods
+    -------
+    read_message(self) -> Optional[Bar]:
+        Returns the next closed bar, reading trades until one is available.
+    has_message(self) -> bool:
+        Returns True while there are trades or closed bars left.
+    '''
+
+    def __init__(self, name: str, trades: TradeSource, grace_seconds: int = 10) -> None:
+        super().__init__(name)
+        self.trades = trades
+        self.infinite_flag = trades.infinite_flag
+        self.aggregator = BarAggregator(grace_seconds)
+        self._bars = deque()
+
+    def read_message(self) -> Optional[Bar]:
+        '''Returns the next closed bar, reading trades until one is available. Returns None if no bars are left.'''
+        while not self._bars:
+            trade = self.trades.read_message()
+            if trade is None:
+                # The trade stream has ended, close the remaining bars
+                self._bars.extend(self.aggregator.flush())
+                self.infinite_flag = False
+                break
+            self._bars.extend(self.aggregator.add(trade))
+
+        return self._bars.popleft() if self._bars else None
+
+    def has_message(self) -> bool:
+        '''Returns True while there are trades or closed bars left.'''
+        return bool(self._bars) or self.trades.has_message() or self.aggregator.has_open_bars()
+
+class BatchSink(Sink):
+    '''
+    A class that buffers messages and writes them to another sink in batches.
+
+    Attributes
+    ----------
+    name : str
+        A name used to identify the sink.
+    target : Sink
+        The sink to which the batches are written.
+    batch_size : int
+        The number of messages written in one batch.
+
+    Methods
+    -------
+    write_message(self, msg: Message) -> None:
+        Buffers a message and writes the buffer once it is full.
+    flush(self) -> None:
+        Writes the buffered messages to the target sink.
+    '''
+
+    def __init__(self, name: str, target: Sink, batch_size: int = 10) -> None:
+        super().__init__(name)
+        self.target = target
+        self.batch_size = batch_size
+        self._buffer = []
+
+    def write_message(self, msg: Message) -> None:
+        '''Buffers a message and writes the buffer once it is full. None messages are ignored.'''
+        if msg is None:
+            return
+        self._buffer.append(msg)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        '''Writes the buffered messages to the target sink.'''
+        if self._buffer:
+            self.target.write_messages(self._buffer)
+            self._buffer = []
+        self.target.flush()
+
+class SQLiteBarSink(SQLiteSink):
+    '''
+    A class that writes one minute bars to a table in SQLite Database.
+
+    The table is created if it does not exist.
+
+    Attributes
+    ----------
+    name : str
+        A name used to identify the sink.
+    db_name : str
+        The name of the SQLite database
+    table_name : str
+        Name of the table to be loaded
+
+    Methods
+    -------
+    write_message(self, msg: Bar) -> None:
+        Writes a Bar object passed as argument to the table.
+    write_messages(self, msgs: list[Bar]) -> None:
+        Writes a batch of Bar objects to the table in a single transaction.
+    '''
+
+    def __init__(self, name: str, db_name: str, table_name: str) -> None:
+        super().__init__(name, db_name, table_name)
+        self._table_created = False
+
+    def _create_table(self, cursor: sqlite3.Cursor) -> None:
+        '''Creates the bars table if it does not exist.'''
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table_name} ('
+            'symbol TEXT NOT NULL, ts TEXT NOT NULL, vwap REAL, open REAL, high REAL, low REAL, close REAL, '
+            'volume REAL, trade_count INTEGER, PRIMARY KEY (symbol, ts))'
+        )
+        self._table_created = True
+
+    def write_message(self, msg: Bar) -> None:
+        '''Writes a Bar object passed as argument to the table.'''
+        self.write_messages([msg])
+
+    def write_messages(self, msgs: list[Bar]) -> None:
+        '''Writes a batch of Bar objects to the table in a single transaction. Bars already in the table are replaced.'''
+        if not msgs:
+            return
+        try:
+            cursor = self._open_conn()
+            if not self._table_created:
+                self._create_table(cursor)
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {self.table_name} '
+                '(symbol, ts, vwap, open, high, low, close, volume, trade_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(bar.key, bar.ts.isoformat(), bar.value, bar.open, bar.high, bar.low, bar.close, bar.volume, bar.trade_count)
+                 for bar in msgs]
+            )
+            self._commit()
+        except sqlite3.Error as e:
+            raise e
+        finally:
+            if self.conn:
+                self._close_conn()
+
+def persist_vwap_bars(db_name: str, table_name: str, batch_size: int = 10, max_bars: Optional[int] = None) -> None:
+    '''
+    Opens the websocket to Binance exchange and writes the closed one minute bars to a table in SQLite Database.
+    Runs until max_bars bars are written, or forever if max_bars is None.
+    '''
+    trades = TradeSource('Binance Trades').start()
+    bars = VWAPBarSource('Binance VWAP Bars', trades)
+    sink = BatchSink('Batched Bars', SQLiteBarSink('Bar Sink', db_name, table_name), batch_size)
+
+    try:
+        ETL(bars, sink).run(math.inf if max_bars is None else max_bars)
+    finally:
+        trades.close()
+
+
+if __name__ == "__main__":
+    persist_vwap_bars('bars.db', 'vwap_bars')
@@ -0,0 +1,151 @@
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+
+from bitcoin_etl import BarAggregator, BatchSink, SQLiteBarSink, Trade, TradeSource, VWAPBarSource
+from etl_system import ETL, FileSource, SQLiteSink, Source
+
+# Start of a minute, in milliseconds since epoch
+BASE_MS = 1_700_000_040_000 - 1_700_000_040_000 % 60000
+
+def trade_message(offset_ms, price, volume=1.0, symbol='BINANCE:BTCUSDT'):
+    '''Returns a finnhub.io json message with a single trade made offset_ms after BASE_MS.'''
+    return json.dumps({'type': 'trade', 'data': [{'s': symbol, 'p': price, 'v': volume, 't': BASE_MS + offset_ms}]})
+
+def make_trade(offset_ms, price, volume=1.0):
+    ts = datetime.datetime.fromtimestamp((BASE_MS + offset_ms) / 1000).astimezone()
+    return Trade('BINANCE:BTCUSDT', price, ts, volume)
+
+def temp_db():
+    return os.path.join(tempfile.mkdtemp(), 'bars.db')
+
+def read_rows(db_name, table_name):
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute(f'SELECT * FROM {table_name} ORDER BY ts').fetchall()
+    conn.close()
+    return rows
+
+def test_bar_ohlc_and_vwap_with_out_of_order_trades():
+    aggregator = BarAggregator()
+    for offset_ms, price, volume in [(30000, 102.0, 1.0), (5000, 100.0, 3.0), (50000, 101.0, 2.0), (40000, 105.0, 1.0)]:
+        assert aggregator.add(make_trade(offset_ms, price, volume)) == []
+
+    bars = aggregator.flush()
+    assert len(bars) == 1
+    bar = bars[0]
+    assert (bar.open, bar.high, bar.low, bar.close) == (100.0, 105.0, 100.0, 101.0)
+    assert (bar.volume, bar.trade_count) == (7.0, 4)
+    assert abs(bar.value - (102.0 + 300.0 + 202.0 + 105.0) / 7.0) < 1e-9
+    assert not aggregator.has_open_bars()
+
+def test_minute_is_closed_after_grace_period():
+    aggregator = BarAggregator(grace_seconds=10)
+    assert aggregator.add(make_trade(10000, 100.0)) == []
+    # Within the grace period after the end of the minute the bar stays open
+    assert aggregator.add(make_trade(69000, 101.0)) == []
+    assert aggregator.has_open_bars()
+
+    bars = aggregator.add(make_trade(71000, 102.0))
+    assert [bar.trade_count for bar in bars] == [1]
+    assert bars[0].ts.timestamp() * 1000 == BASE_MS
+
+def test_late_trades_are_dropped():
+    aggregator = BarAggregator(grace_seconds=10)
+    aggregator.add(make_trade(10000, 100.0))
+    aggregator.add(make_trade(75000, 101.0))
+
+    # The first minute is closed, a trade arriving for it now is late
+    assert aggregator.add(make_trade(20000, 99.0)) == []
+    assert aggregator.late_trades == 1
+    # Late-arriving trades for the open minute are still aggregated
+    aggregator.add(make_trade(61000, 103.0))
+    bars = aggregator.flush()
+    assert [(bar.open, bar.trade_count) for bar in bars] == [(103.0, 2)]
+
+def test_etl_writes_bars_to_sqlite_until_stream_ends():
+    trades = TradeSource('Trades')
+    # The bar source is created while the stream is still open, so it starts out infinite
+    bars = VWAPBarSource('Bars', trades)
+    for minute in range(3):
+        for second in range(0, 60, 20):
+            trades.feed(trade_message(minute * 60000 + second * 1000, 100.0 + minute))
+    trades.feed(json.dumps({'type': 'ping'}))
+    trades.close()
+
+    db_name = temp_db()
+    ETL(bars, SQLiteBarSink('Bar Sink', db_name, 'bars')).run(max_messages=10)
+
+    rows = read_rows(db_name, 'bars')
+    assert [(row[2], row[8]) for row in rows] == [(100.0, 3), (101.0, 3), (102.0, 3)]
+    assert not bars.has_message()
+
+def test_etl_run_stops_at_max_messages():
+    trades = TradeSource('Trades')
+    bars = VWAPBarSource('Bars', trades)
+    for minute in range(4):
+        trades.feed(trade_message(minute * 60000, 100.0))
+    trades.close()
+
+    db_name = temp_db()
+    ETL(bars, BatchSink('Batch', SQLiteBarSink('Bar Sink', db_name, 'bars'), batch_size=10)).run(max_messages=2)
+
+    # The batch is smaller than batch_size, so the rows are only there because run flushes the sink
+    assert len(read_rows(db_name, 'bars')) == 2
+    assert bars.has_message()
+
+def test_etl_run_flushes_sink_when_source_fails():
+    class FailingSource(Source):
+        def __init__(self, name, bars):
+            super().__init__(name)
+            self.bars = bars
+
+        def read_message(self):
+            if not self.bars:
+                raise RuntimeError('source failed')
+            return self.bars.pop(0)
+
+        def has_message(self):
+            return True
+
+    aggregator = BarAggregator()
+    for minute in range(2):
+        aggregator.add(make_trade(minute * 60000, 100.0))
+    db_name = temp_db()
+
+    try:
+        ETL(FailingSource('Failing', aggregator.flush()), BatchSink('Batch', SQLiteBarSink('Bar Sink', db_name, 'bars'))).run()
+    except RuntimeError:
+        pass
+    else:
+        assert False, 'the source error should be raised'
+
+    assert len(read_rows(db_name, 'bars')) == 2
+
+def test_etl_run_reads_whole_finite_source():
+    tmp_dir = tempfile.mkdtemp()
+    file_path = os.path.join(tmp_dir, 'messages.json')
+    with open(file_path, 'w') as file:
+        json.dump([{'key': f'A{i:03d}', 'value': str(i), 'ts': '2020-10-07 13:28:43.399620+02:00'} for i in range(5)], file)
+
+    db_name = os.path.join(tmp_dir, 'messages.db')
+    conn = sqlite3.connect(db_name)
+    conn.execute('CREATE TABLE msg_table (id TEXT, value REAL, ts TEXT)')
+    conn.commit()
+    conn.close()
+
+    sink = SQLiteSink('DB Sink', db_name, 'msg_table')
+    ETL(FileSource('File', file_path), sink).run(max_messages=3)
+    assert len(read_rows(db_name, 'msg_table')) == 3
+
+    sink.cleanup_table()
+    ETL(FileSource('File', file_path), sink).run()
+    assert len(read_rows(db_name, 'msg_table')) == 5
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f'{name} passed')
@@ -8,35 +8,56 @@ class Suit(str, Enum):
     Heart = "♥"
     Spade = "♠"
 
+# Cards are immutable and interned: there is a single BlackJackCard object for each rank and suit,
+# and its hard and soft values are computed once when it is created.
 class BlackJackCard:
 
+    __slots__ = ("rank", "suit", "hard", "soft")
+
     rank_values = {"2": 2, "3": 3,"4": 4,"5": 5,
                    "6": 6,"7": 7,"8": 8,"9": 9,"10": 10,
                    "J": 10, "Q": 10, "K": 10, "A": 1}
 
-    def __init__(
-            self,
+    _instances = {}
+
+    def __new__(
+            cls,
             rank: str,
             suit: Suit
-     ) -> None:
-        if rank not in self.rank_values:
-            raise ValueError(f"{rank} is not a valid rank.")
-        self.rank = rank
-        self.suit = suit
+     ) -> "BlackJackCard":
+        card = cls._instances.get((rank, suit))
+        if card is None:
+            if rank not in cls.rank_values:
+                raise ValueError(f"{rank} is not a valid rank.")
+            card = super().__new__(cls)
+            object.__setattr__(card, "rank", rank)
+            object.__setattr__(card, "suit", suit)
+            object.__setattr__(card, "hard", cls.rank_values[rank])
+            object.__setattr__(card, "soft", 11 if rank == "A" else cls.rank_values[rank])
+            cls._instances[(rank, suit)] = card
+        return card
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __reduce__(self):
+        return (self.__class__, (self.rank, self.suit))
 
     def __str__(self) -> str:
         return f"{self.rank} of {self.suit.value}"
 
-    @property
-    def hard(self) -> int:
-        return self.rank_values[self.rank]
-    
-    @property
-    def soft(self) -> int:
-        if self.rank == "A":
-            return 11
-        else:
-            return self.rank_values[self.rank]
+# Best total of a hand indexed by [hard_total][has_ace]: one ace counts as 11 if that doesn't bust the hand.
+# Covers every hard total a hand can reach by hitting below 21, larger totals are busted and stay hard.
+BEST_TOTAL = tuple(
+    (hard_total, hard_total + 10 if hard_total <= 11 else hard_total)
+    for hard_total in range(32)
+)
+
+def best_total(hard_total: int, aces: int) -> int:
+    '''Returns the best total of a hand: one ace counts as 11 if that doesn't bust the hand.'''
+    if hard_total < len(BEST_TOTAL):
+        return BEST_TOTAL[hard_total][aces > 0]
+    return hard_total
 
 class Deck():
     def __init__(self) -> None:
@@ -71,14 +92,21 @@ class Hand:
             f"{', '.join(map(repr, self.card))})"
         )
 
+# Keeps a running hard total and ace count which are updated when cards are added or removed,
+# so the total is found in constant time.
 class Hand_Lazy(Hand):
+    def __init__(
+        self,
+        dealer_card: BlackJackCard,
+        *cards: BlackJackCard
+    ) -> None:
+        super().__init__(dealer_card, *cards)
+        self._hard_total = sum(c.hard for c in self._cards)
+        self._aces = sum(c.rank == "A" for c in self._cards)
+
     @property
     def total(self) -> int:
-        delta_soft = max(c.soft - c.hard for c in self._cards)
-        hard_total = sum(c.hard for c in self ._cards)
-        if hard_total + delta_soft <= 21:
-            return hard_total + delta_soft
-        return hard_total
+        return best_total(self._hard_total, self._aces)
 
     @property
     def card(self) -> List[BlackJackCard]:
@@ -87,10 +115,14 @@ class Hand_Lazy(Hand):
     @card.setter
     def card(self, aCard: BlackJackCard) -> None:
         self._cards.append(aCard)
+        self._hard_total += aCard.hard
+        self._aces += aCard.rank == "A"
 
     @card.deleter
     def card(self) -> None:
-        self._cards.pop(-1)
+        aCard = self._cards.pop(-1)
+        self._hard_total -= aCard.hard
+        self._aces -= aCard.rank == "A"
 
 def main():
     d = Deck()
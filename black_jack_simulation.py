@@ -0,0 +1,313 @@
+import os
+import random
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from black_jack_deck import BEST_TOTAL, BlackJackCard, best_total
+
+# Cards are encoded as small integers: 0-12 for the ranks 2-10, J, Q, K, A.
+# Suits don't matter in blackjack, so a shoe is an array of rank codes.
+RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
+ACE = RANKS.index("A")
+
+# Hard value of each card code, aces count as 1
+CARD_VALUES = array('B', [BlackJackCard.rank_values[rank] for rank in RANKS])
+
+# The dealer hits until reaching this total and stands on all 17s
+DEALER_STANDS_ON = 17
+
+class StrategyStats:
+    '''
+    A class that holds the results of the hands played with a strategy.
+
+    Attributes
+    ----------
+    stand_on : int
+        The total on which the player stands.
+    hands, wins, losses, pushes : int
+        The number of hands played, won, lost and pushed.
+    player_busts, dealer_busts, blackjacks : int
+        The number of hands in which the player busted, the dealer busted and the player had a natural blackjack.
+    '''
+
+    def __init__(self, stand_on: int) -> None:
+        self.stand_on = stand_on
+        self.hands = 0
+        self.wins = 0
+        self.losses = 0
+        self.pushes = 0
+        self.player_busts = 0
+        self.dealer_busts = 0
+        self.blackjacks = 0
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.stand_on})'
+
+    def __str__(self) -> str:
+        return (f'stand on {self.stand_on:2d}: hands:{self.hands} win:{self.win_rate:.4f} loss:{self.loss_rate:.4f} '
+                f'push:{self.pushes / self.hands if self.hands else 0.0:.4f} bust:{self.bust_rate:.4f} '
+                f'dealer bust:{self.dealer_busts / self.hands if self.hands else 0.0:.4f}')
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.hands if self.hands else 0.0
+
+    @property
+    def loss_rate(self) -> float:
+        return self.losses / self.hands if self.hands else 0.0
+
+    @property
+    def bust_rate(self) -> float:
+        return self.player_busts / self.hands if self.hands else 0.0
+
+    def merge(self, other: 'StrategyStats') -> 'StrategyStats':
+        '''Adds the results of another StrategyStats object for the same strategy and returns a self reference.'''
+        if other.stand_on != self.stand_on:
+            raise ValueError('Cannot merge results of different strategies')
+        self.hands += other.hands
+        self.wins += other.wins
+        self.losses += other.losses
+        self.pushes += other.pushes
+        self.player_busts += other.player_busts
+        self.dealer_busts += other.dealer_busts
+        self.blackjacks += other.blackjacks
+        return self
+
+def _check_strategies(strategies: Iterable[int]) -> list[int]:
+    '''Returns the distinct strategies sorted. Raises ValueError if a strategy is not a total between 2 and 21.'''
+    strategies = sorted(set(strategies))
+    for stand_on in strategies:
+        if not 2 <= stand_on <= 21:
+            raise ValueError(f'{stand_on} is not a valid strategy, the player must stand on a total between 2 and 21')
+    return strategies
+
+def new_shoe(num_decks: int = 6) -> array:
+    '''Returns an unshuffled shoe of num_decks decks encoded as card codes.'''
+    return array('B', [code for _ in range(4 * num_decks) for code in range(len(RANKS))])
+
+def shuffle_shoe(shoe: array, rng: random.Random) -> None:
+    '''Shuffles the shoe in place with the Fisher-Yates algorithm.'''
+    randbelow = rng.randrange
+    for i in range(len(shoe) - 1, 0, -1):
+        j = randbelow(i + 1)
+        shoe[i], shoe[j] = shoe[j], shoe[i]
+
+def _draw_to(shoe: array, pos: int, hard_total: int, aces: int, stand_on: int) -> tuple[int, int]:
+    '''Draws cards from the shoe starting at pos until the best total reaches stand_on. Returns the best total and the next position.'''
+    # The hard total stays within the lookup table: it is at most 20 before the last card is drawn
+    total = BEST_TOTAL[hard_total][aces > 0]
+    while total < stand_on:
+        code = shoe[pos]
+        pos += 1
+        hard_total += CARD_VALUES[code]
+        aces += code == ACE
+        total = BEST_TOTAL[hard_total][aces > 0]
+    return total, pos
+
+def _score(stats: StrategyStats, player: int, dealer: int, player_blackjack: bool, dealer_blackjack: bool) -> None:
+    '''Records the outcome of a hand in stats.'''
+    stats.hands += 1
+    if player_blackjack:
+        stats.blackjacks += 1
+    if player_blackjack or dealer_blackjack:
+        if player_blackjack and dealer_blackjack:
+            stats.pushes += 1
+        elif player_blackjack:
+            stats.wins += 1
+        else:
+            stats.losses += 1
+    elif player > 21:
+        stats.player_busts += 1
+        stats.losses += 1
+    elif dealer > 21:
+        stats.dealer_busts += 1
+        stats.wins += 1
+    elif player > dealer:
+        stats.wins += 1
+    elif player < dealer:
+        stats.losses += 1
+    else:
+        stats.pushes += 1
+
+def simulate(
+        strategies: Iterable[int],
+        num_hands: int,
+        num_decks: int = 6,
+        seed: Optional[int | str] = None,
+        penetration: float = 0.75
+    ) -> dict[int, StrategyStats]:
+    '''
+    Simulates num_hands hands for each strategy and returns the statistics keyed by strategy.
+    A strategy is the total on which the player stands. All strategies play the same deals, so their results
+    can be compared directly. The shoe is reshuffled once penetration of it has been dealt.
+    '''
+    strategies = _check_strategies(strategies)
+    results = {stand_on: StrategyStats(stand_on) for stand_on in strategies}
+    rng = random.Random(seed)
+    shoe = new_shoe(num_decks)
+    # Leave enough cards for the longest possible deal
+    reshuffle_at = min(int(len(shoe) * penetration), len(shoe) - 30)
+    values = CARD_VALUES
+    pos = len(shoe)
+
+    for _ in range(num_hands):
+        if pos >= reshuffle_at:
+            shuffle_shoe(shoe, rng)
+            pos = 0
+
+        p1, d1, p2, d2 = shoe[pos], shoe[pos + 1], shoe[pos + 2], shoe[pos + 3]
+        pos += 4
+        player_hard, player_aces = values[p1] + values[p2], (p1 == ACE) + (p2 == ACE)
+        dealer_hard, dealer_aces = values[d1] + values[d2], (d1 == ACE) + (d2 == ACE)
+        player_blackjack = best_total(player_hard, player_aces) == 21
+        dealer_blackjack = best_total(dealer_hard, dealer_aces) == 21
+
+        # Every strategy draws from the same point in the shoe, the shoe then moves past the longest hand
+        next_pos = pos
+        for stand_on in strategies:
+            if player_blackjack or dealer_blackjack:
+                _score(results[stand_on], 0, 0, player_blackjack, dealer_blackjack)
+                continue
+            player, hand_pos = _draw_to(shoe, pos, player_hard, player_aces, stand_on)
+            dealer = 0
+            if player <= 21:
+                dealer, hand_pos = _draw_to(shoe, hand_pos, dealer_hard, dealer_aces, DEALER_STANDS_ON)
+            _score(results[stand_on], player, dealer, False, False)
+            next_pos = max(next_pos, hand_pos)
+        pos = next_pos
+
+    return results
+
+def simulate_numpy(
+        strategies: Iterable[int],
+        num_hands: int,
+        num_decks: int = 6,
+        seed: Optional[int] = None,
+        batch_size: int = 50_000
+    ) -> dict[int, StrategyStats]:
+    '''
+    Vectorized version of simulate which deals the hands in batches with NumPy. Requires NumPy.
+    Unlike simulate, every hand is dealt from the top of its own freshly shuffled shoe, so there is no penetration
+    and no card counting effect. The results therefore differ slightly from simulate for the same number of decks.
+    '''
+    if np is None:
+        raise ImportError('simulate_numpy requires NumPy')
+
+    strategies = _check_strategies(strategies)
+    results = {stand_on: StrategyStats(stand_on) for stand_on in strategies}
+    rng = np.random.default_rng(seed)
+    shoe = np.frombuffer(new_shoe(num_decks), dtype=np.uint8)
+    values = np.frombuffer(CARD_VALUES, dtype=np.uint8).astype(np.int16)
+    # A hand never needs more cards than this
+    width = min(len(shoe), 48)
+
+    def draw_to(cards, hard, aces, pos, stand_on, active):
+        rows = np.arange(len(hard))
+        hit = active & (np.where((aces > 0) & (hard <= 11), hard + 10, hard) < stand_on)
+        while hit.any():
+            codes = cards[rows, np.minimum(pos, width - 1)]
+            hard = hard + np.where(hit, values[codes], 0)
+            aces = aces + (hit & (codes == ACE))
+            pos = pos + hit
+            hit = active & (np.where((aces > 0) & (hard <= 11), hard + 10, hard) < stand_on)
+        return np.where((aces > 0) & (hard <= 11), hard + 10, hard), pos
+
+    remaining = num_hands
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        remaining -= size
+        # Shuffle only the first width positions of each shoe with a partial Fisher-Yates shuffle,
+        # the rest of the shoe is never dealt
+        cards = np.tile(shoe, (size, 1))
+        rows = np.arange(size)
+        for i in range(width):
+            j = rng.integers(i, len(shoe), size)
+            picked = cards[rows, j]
+            cards[rows, j] = cards[:, i]
+            cards[:, i] = picked
+        cards = cards[:, :width]
+
+        player_hard = values[cards[:, 0]] + values[cards[:, 2]]
+        player_aces = (cards[:, 0] == ACE).astype(np.int16) + (cards[:, 2] == ACE)
+        dealer_hard = values[cards[:, 1]] + values[cards[:, 3]]
+        dealer_aces = (cards[:, 1] == ACE).astype(np.int16) + (cards[:, 3] == ACE)
+        player_blackjack = (player_aces > 0) & (player_hard == 11)
+        dealer_blackjack = (dealer_aces > 0) & (dealer_hard == 11)
+        naturals = player_blackjack | dealer_blackjack
+        start = np.full(size, 4)
+
+        for stand_on in strategies:
+            player, pos = draw_to(cards, player_hard, player_aces, start, stand_on, ~naturals)
+            player_bust = ~naturals & (player > 21)
+            dealer, _ = draw_to(cards, dealer_hard, dealer_aces, pos, DEALER_STANDS_ON, ~naturals & ~player_bust)
+            dealer_bust = ~naturals & ~player_bust & (dealer > 21)
+            played = ~naturals & ~player_bust & ~dealer_bust
+
+            stats = results[stand_on]
+            stats.hands += size
+            stats.blackjacks += int(player_blackjack.sum())
+            stats.player_busts += int(player_bust.sum())
+            stats.dealer_busts += int(dealer_bust.sum())
+            stats.wins += int((player_blackjack & ~dealer_blackjack).sum() + dealer_bust.sum() + (played & (player > dealer)).sum())
+            stats.losses += int((dealer_blackjack & ~player_blackjack).sum() + player_bust.sum() + (played & (player < dealer)).sum())
+            stats.pushes += int((player_blackjack & dealer_blackjack).sum() + (played & (player == dealer)).sum())
+
+    return results
+
+def _simulate_worker(args: tuple) -> dict[int, StrategyStats]:
+    '''Runs a simulation in a worker process with its own random number stream.'''
+    strategies, num_hands, num_decks, seed, use_numpy = args
+    if use_numpy:
+        return simulate_numpy(strategies, num_hands, num_decks, seed)
+    return simulate(strategies, num_hands, num_decks, seed)
+
+def simulate_parallel(
+        strategies: Iterable[int],
+        num_hands: int,
+        num_decks: int = 6,
+        seed: Optional[int] = None,
+        workers: Optional[int] = None,
+        use_numpy: bool = False
+    ) -> dict[int, StrategyStats]:
+    '''
+    Splits the hands between worker processes and returns the merged statistics keyed by strategy.
+    Each worker gets an independent random number stream derived from seed, so results are reproducible for a given seed and number of workers.
+    With use_numpy the workers run simulate_numpy, which is faster but deals every hand from a fresh shoe.
+    '''
+    strategies = _check_strategies(strategies)
+    workers = workers or os.cpu_count() or 1
+
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    if use_numpy:
+        worker_seeds = np.random.SeedSequence(seed).spawn(workers)
+    else:
+        worker_seeds = [f'{seed}-{worker}' for worker in range(workers)]
+
+    chunks = [num_hands // workers + (worker < num_hands % workers) for worker in range(workers)]
+    jobs = [(strategies, chunk, num_decks, worker_seed, use_numpy)
+            for chunk, worker_seed in zip(chunks, worker_seeds) if chunk]
+
+    results = {stand_on: StrategyStats(stand_on) for stand_on in strategies}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for worker_results in executor.map(_simulate_worker, jobs):
+            for stand_on, stats in worker_results.items():
+                results[stand_on].merge(stats)
+
+    return results
+
+def main():
+    num_hands = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    results = simulate_parallel(range(12, 19), num_hands, seed=2024)
+    for stats in results.values():
+        print(stats)
+
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,332 @@
 import sys
 import os
+import argparse
+import glob
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
-def convert_to_celsius(fahrenheit):
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Number of lines which are read, converted and written at once by the streaming converter
+BLOCK_LINES = 65536
+
+# Longest line the NumPy converter handles. NumPy stores every line of a block with the width of the longest one,
+# so blocks with longer lines are converted by convert_block instead
+NUMPY_MAX_LINE_LENGTH = 64
+
+# Endings of the output and invalid line report files written by the converter
+OUTPUT_SUFFIXES = ('.celsius.txt', '.fahrenheit.txt', '.invalid.txt')
+
+def parse_temperature(text):
     '''
-    Converts Fahrenheit tempreture value to Celsius.
+    Parses a temperature string like 10F or -15C.
+    Returns a tuple with the value and the upper case unit, or None if the string is not a valid temperature.
     '''
+    text = text.strip()
+    if not text:
+        return None
 
-    # Strings ending with 'F' are considered valid values
-    # In case of invalid values the function returns None
-    if fahrenheit[-1].upper() == 'F':
-        try:
-            fahrenheit = float(fahrenheit[:-1])
-            celsius = (fahrenheit - 32) * 5.0/9.0
-            return celsius
-        except ValueError:
-            return None
-    else:
+    unit = text[-1].upper()
+    if unit != 'F' and unit != 'C':
+        return None
+
+    try:
+        return float(text[:-1]), unit
+    except ValueError:
         return None
 
-def read_from_file(filepath):
+def convert_temperature(value, unit, target_unit='C'):
+    '''
+    Converts a temperature value from unit to target_unit, both 'F' or 'C'.
+    '''
+    if unit == target_unit:
+        return value
+    if target_unit == 'C':
+        return (value - 32) * 5.0/9.0
+    return value * 9.0/5.0 + 32
+
+def convert_block(lines, target_unit='C'):
+    '''
+    Converts a block of temperature lines to target_unit, parsing each line once.
+    Returns a list with the converted values as strings and a list with the indices of the invalid lines in the block.
+    '''
+    converted = []
+    invalid = []
+
+    for i, line in enumerate(lines):
+        parsed = parse_temperature(line)
+        if parsed is None:
+            invalid.append(i)
+        else:
+            converted.append(str(convert_temperature(parsed[0], parsed[1], target_unit)))
+
+    return converted, invalid
+
+def convert_block_numpy(lines, target_unit='C'):
     '''
-    Reads data from a text file returns a list of the lines.
+    NumPy version of convert_block. The lines of the block are stripped, split into value and unit and parsed
+    with vectorized NumPy operations, and all values are converted at once.
+    The results are still formatted one by one with str(), so that the output is the same as with convert_block.
+    Falls back to convert_block if the block contains values which NumPy can't parse, or lines longer than
+    NUMPY_MAX_LINE_LENGTH.
     '''
+    if not lines or max(map(len, lines)) > NUMPY_MAX_LINE_LENGTH:
+        return convert_block(lines, target_unit)
+
+    text = np.char.strip(np.array(lines, dtype=str))
+    lengths = np.char.str_len(text)
+
+    # View the fixed width strings as a matrix of character codes to read and remove the unit of each line
+    codes = text.view(np.uint32).reshape(len(text), -1)
+    units = np.zeros(len(text), dtype=np.uint32)
+    non_empty = np.flatnonzero(lengths)
+    units[non_empty] = codes[non_empty, lengths[non_empty] - 1]
+
+    is_fahrenheit = (units == ord('F')) | (units == ord('f'))
+    valid = is_fahrenheit | (units == ord('C')) | (units == ord('c'))
+    valid_rows = np.flatnonzero(valid)
+    # A zero character ends a NumPy string, so this cuts the unit off
+    codes[valid_rows, lengths[valid_rows] - 1] = 0
+
     try:
-        with open(filepath, 'r') as file:
-            return [line.strip() for line in file]
+        temperatures = text[valid_rows].astype(np.float64)
+    except ValueError:
+        return convert_block(lines, target_unit)
 
-    except FileNotFoundError:
-        print(f'Error: File "{filepath}" not found.')
+    is_fahrenheit = is_fahrenheit[valid_rows]
+    if target_unit == 'C':
+        temperatures = np.where(is_fahrenheit, (temperatures - 32) * 5.0/9.0, temperatures)
+    else:
+        temperatures = np.where(is_fahrenheit, temperatures, temperatures * 9.0/5.0 + 32)
+
+    return list(map(str, temperatures.tolist())), np.flatnonzero(~valid).tolist()
 
+def temporary_file(filepath):
+    '''
+    Opens a temporary file for writing in the directory of filepath, to be moved to filepath by replace_file.
+    '''
+    return tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(filepath)), prefix='.tmp_', suffix='.txt', delete=False)
 
-def write_to_file(filepath, data):
+def replace_file(tmp_filepath, filepath):
     '''
-    Writes data from a sequence to a text file.
+    Atomically replaces filepath with the temporary file. The temporary file is created with mode 0600,
+    so it gets the mode of the file it replaces, or the default mode for new files if there is none.
     '''
     try:
-        with open(filepath, 'w') as file:
-            for item in data:
-                file.write(str(item) + '\n')
+        mode = os.stat(filepath).st_mode & 0o7777
     except FileNotFoundError:
-        print(f'Error: File "{filepath}" not found.')
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(tmp_filepath, mode)
+    os.replace(tmp_filepath, filepath)
+
+def convert_file(src_filepath, trg_filepath, target_unit='C', block_lines=BLOCK_LINES, use_numpy=False, invalid_filepath=None):
+    '''
+    Streams temperatures from the source file to the target file converted to target_unit.
+    The file is processed in blocks of block_lines lines, so memory use doesn't depend on the file size.
+    Invalid lines are skipped, and written with their line numbers to invalid_filepath if it is given.
+    Both files are written to temporary files which replace them at the end, so they are never left half written.
+    Returns a dictionary with the number of parsed, converted and invalid lines.
+    '''
+    if use_numpy and np is None:
+        raise ImportError('use_numpy requires NumPy')
+    convert = convert_block_numpy if use_numpy else convert_block
+
+    counts = {'parsed': 0, 'converted': 0, 'invalid': 0}
+    tmp_files = []
+
+    with open(src_filepath, 'r') as src_file:
+        try:
+            tmp_file = temporary_file(trg_filepath)
+            tmp_files.append(tmp_file)
+            invalid_file = None
+            if invalid_filepath:
+                invalid_file = temporary_file(invalid_filepath)
+                tmp_files.append(invalid_file)
+
+            while True:
+                lines = list(islice(src_file, block_lines))
+                if not lines:
+                    break
+
+                converted, invalid = convert(lines, target_unit)
+                if converted:
+                    tmp_file.write('\n'.join(converted) + '\n')
+                if invalid_file and invalid:
+                    invalid_file.write(''.join(f'{counts["parsed"] + i + 1}: {lines[i].rstrip()}\n' for i in invalid))
+
+                counts['parsed'] += len(lines)
+                counts['converted'] += len(converted)
+                counts['invalid'] += len(invalid)
 
-def main():
+            for file in tmp_files:
+                file.close()
+            replace_file(tmp_file.name, trg_filepath)
+            if invalid_file:
+                replace_file(invalid_file.name, invalid_filepath)
+        except BaseException:
+            for file in tmp_files:
+                file.close()
+                if os.path.exists(file.name):
+                    os.remove(file.name)
+            raise
+
+    return counts
+
+def output_filepath(src_filepath, output_dir=None, target_unit='C', base_dir=None):
+    '''
+    Returns the output file path for a source file, e.g. data/sensor1.txt -> data/sensor1.celsius.txt
+    With output_dir the directory of the source file relative to base_dir is kept under output_dir,
+    e.g. data/a/sensor1.txt with base_dir data -> output_dir/a/sensor1.celsius.txt
+    '''
+    base, _ = os.path.splitext(os.path.basename(src_filepath))
+    unit_name = 'celsius' if target_unit == 'C' else 'fahrenheit'
+    src_dir = os.path.dirname(src_filepath)
+    if output_dir:
+        src_dir = os.path.join(output_dir, os.path.relpath(os.path.abspath(src_dir), base_dir or os.path.abspath(src_dir)))
+    return os.path.normpath(os.path.join(src_dir, f'{base}.{unit_name}.txt'))
+
+def convert_job(job):
+    '''
+    Converts one file of a batch and returns its summary. Errors are reported in the summary instead of raised,
+    so that one bad file doesn't stop the other files. Runs in a worker process.
+    '''
+    src_filepath, trg_filepath, target_unit, use_numpy, invalid_report = job
+    invalid_filepath = os.path.splitext(trg_filepath)[0] + '.invalid.txt' if invalid_report else None
+    summary = {'source': src_filepath, 'target': trg_filepath, 'error': None,
+               'parsed': 0, 'converted': 0, 'invalid': 0, 'seconds': 0.0}
+
+    begin = time.perf_counter()
+    try:
+        summary.update(convert_file(src_filepath, trg_filepath, target_unit, use_numpy=use_numpy, invalid_filepath=invalid_filepath))
+    except Exception as e:
+        summary['error'] = f'{type(e).__name__}: {e}'
+    summary['seconds'] = time.perf_counter() - begin
+
+    return summary
+
+def convert_files(src_filepaths, output_dir=None, target_unit='C', workers=None, use_numpy=False, invalid_report=False):
+    '''
+    Converts many files, in parallel on a pool of worker processes unless workers is 1.
+    With output_dir the directory structure of the source files below their common directory is kept.
+    Raises ValueError if two source files would be written to the same output file.
+    Returns a list with the summary of each file.
+    '''
+    base_dir = None
+    if output_dir and src_filepaths:
+        base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(src_filepath)) for src_filepath in src_filepaths])
+
+    jobs = [(src_filepath, output_filepath(src_filepath, output_dir, target_unit, base_dir), target_unit, use_numpy, invalid_report)
+            for src_filepath in src_filepaths]
+
+    targets = {}
+    for src_filepath, trg_filepath, *_ in jobs:
+        if trg_filepath in targets:
+            raise ValueError(f'"{targets[trg_filepath]}" and "{src_filepath}" would both be written to "{trg_filepath}"')
+        targets[trg_filepath] = src_filepath
+
+    if output_dir:
+        for trg_filepath in targets:
+            os.makedirs(os.path.dirname(trg_filepath), exist_ok=True)
+
+    if workers == 1 or len(jobs) <= 1:
+        return [convert_job(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(convert_job, jobs))
+
+def expand_inputs(inputs):
+    '''
+    Expands glob patterns in the input arguments. Arguments which don't match any file are kept as they are,
+    so that they are reported as missing. Output and report files of earlier runs are left out of the glob matches,
+    so that running the same command again doesn't convert them too.
+    '''
+    filepaths = []
+    for pattern in inputs:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches:
+            filepaths.append(pattern)
+        filepaths.extend(match for match in matches if os.path.isfile(match) and not match.endswith(OUTPUT_SUFFIXES))
+    # Drop duplicates and keep the order
+    return list(dict.fromkeys(filepaths))
+
+def format_summary(summaries, seconds):
+    '''
+    Returns a text summary of a batch conversion with a line per file and the totals.
+    '''
+    lines = []
+    for summary in summaries:
+        if summary['error']:
+            lines.append(f'{summary["source"]}: FAILED {summary["error"]}')
+        else:
+            rate = summary['parsed'] / summary['seconds'] if summary['seconds'] else 0.0
+            lines.append(f'{summary["source"]} -> {summary["target"]}: parsed {summary["parsed"]}, '
+                         f'converted {summary["converted"]}, invalid {summary["invalid"]}, {rate:,.0f} lines/s')
+
+    parsed = sum(summary['parsed'] for summary in summaries)
+    converted = sum(summary['converted'] for summary in summaries)
+    invalid = sum(summary['invalid'] for summary in summaries)
+    failed = sum(1 for summary in summaries if summary['error'])
+    rate = parsed / seconds if seconds else 0.0
+    lines.append(f'Total: {len(summaries)} files ({failed} failed), parsed {parsed}, converted {converted}, '
+                 f'invalid {invalid} in {seconds:.2f}s, {rate:,.0f} lines/s')
+    return '\n'.join(lines)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Converts files with temperatures like 10F or -15C, one per line.')
+    parser.add_argument('inputs', nargs='+', help='input files or glob patterns, e.g. "dumps/*.txt"')
+    parser.add_argument('-o', '--output-dir', help='directory for the output files (default: next to each input file)')
+    parser.add_argument('-u', '--target-unit', choices=['C', 'F'], default='C', help='unit of the output values (default: C)')
+    parser.add_argument('-w', '--workers', type=int, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--numpy', action='store_true', help='convert the values with NumPy')
+    parser.add_argument('--invalid-report', action='store_true', help='write the invalid lines of each file to <output>.invalid.txt')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # Without arguments ask for a single file interactively
+    if not argv:
+        return interactive_main()
+
+    args = parse_args(argv)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    begin = time.perf_counter()
+    try:
+        summaries = convert_files(expand_inputs(args.inputs), args.output_dir, args.target_unit,
+                                  args.workers, args.numpy, args.invalid_report)
+    except ValueError as e:
+        print(f'Error: {e}')
+        return 1
+    print(format_summary(summaries, time.perf_counter() - begin))
+
+    return 1 if any(summary['error'] for summary in summaries) else 0
+
+def interactive_main():
     
     # Get source filepath from command line and set target filepath
     src_filepath = input('Please provide filepath location: ')
     trg_filepath = 'celsius.txt'
 
-    # Create a list with converted tempretures read from the source file
-    # Invalid Fahrenheit values are filtered out
-    celsius = [convert_to_celsius(fahrenheit) for fahrenheit in read_from_file(src_filepath) if convert_to_celsius(fahrenheit) is not None]
+    # Stream the converted tempretures read from the source file to the target file
+    # Fahrenheit values are converted, Celsius values are kept and invalid values are filtered out
+    try:
+        counts = convert_file(src_filepath, trg_filepath)
+    except FileNotFoundError:
+        print(f'Error: File "{src_filepath}" not found.')
+        return 1
 
-    write_to_file(trg_filepath, celsius)
+    print(f'Converted {counts["converted"]} of {counts["parsed"]} lines, {counts["invalid"]} invalid lines skipped.')
 
     return 0
 
@@ -1,22 +1,252 @@
+import csv
+import json
+import math
+import random
+import threading
 import time
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
 
-def log_time_decorator(func):
+class TimingStats:
     '''
-    Decorator function that return the execution time of the decorated function
+    Aggregated execution times of a function in nanoseconds.
+    At most max_samples times are kept for the percentiles, chosen by reservoir sampling once there are more calls.
     '''
+    def __init__(self, name, max_samples=10_000):
+        self.name = name
+        self.max_samples = max_samples
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+        self.peak_memory = None
+        self.samples = []
+
+    def add(self, elapsed_ns, peak_memory=None):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if self.min_ns is None or elapsed_ns < self.min_ns:
+            self.min_ns = elapsed_ns
+        if self.max_ns is None or elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        if peak_memory is not None and (self.peak_memory is None or peak_memory > self.peak_memory):
+            self.peak_memory = peak_memory
+
+        if len(self.samples) < self.max_samples:
+            self.samples.append(elapsed_ns)
+        else:
+            i = random.randrange(self.count)
+            if i < self.max_samples:
+                self.samples[i] = elapsed_ns
+
+    def percentile(self, p):
+        '''
+        Returns the p-th percentile (0-100) of the recorded times using the nearest rank method.
+        '''
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'count': self.count,
+            'total_ns': self.total_ns,
+            'mean_ns': self.total_ns // self.count if self.count else None,
+            'min_ns': self.min_ns,
+            'max_ns': self.max_ns,
+            'p50_ns': self.percentile(50),
+            'p90_ns': self.percentile(90),
+            'p99_ns': self.percentile(99),
+            'peak_memory': self.peak_memory,
+        }
+
+# Registry with the timing statistics of all decorated functions, keyed by qualified function name
+timing_registry = {}
+
+# Per thread stack with the traced memory at entry and highest peak seen so far of the calls being measured
+# with trace_memory, innermost last
+_memory_state = threading.local()
+
+def _memory_frames():
+    '''Returns the memory frame stack of the current thread.'''
+    frames = getattr(_memory_state, 'frames', None)
+    if frames is None:
+        frames = _memory_state.frames = []
+    return frames
+
+def log_time_decorator(func=None, *, trace_memory=False, verbose=False, registry=timing_registry):
+    '''
+    Decorator function that records the execution time of the decorated function in the registry.
+    Recursive calls are not timed separately, only the outermost call is recorded.
+    With trace_memory the peak memory allocated during the call is recorded using tracemalloc,
+    calls of other decorated functions nested in it are included. The tracemalloc peak is process wide,
+    so allocations by other threads running at the same time are counted as well.
+    With verbose the time of each call is also printed.
+    Can be used as @log_time_decorator or @log_time_decorator(trace_memory=True).
+    Recursive functions should be decorated where they are called, e.g. log_time_decorator(lucas)(35),
+    so that the recursive calls don't go through the wrapper and add a stack frame each.
+    '''
+    if func is None:
+        return lambda f: log_time_decorator(f, trace_memory=trace_memory, verbose=verbose, registry=registry)
+
+    name = f'{func.__module__}.{func.__qualname__}'
+    stats = registry.setdefault(name, TimingStats(name))
+    # Recursion depth is tracked per thread so that calls from different threads are timed separately
+    local = threading.local()
+
+    @wraps(func)
     def wrapper(*args, **kwargs):
+        if getattr(local, 'active', False):
+            return func(*args, **kwargs)
+
+        local.active = True
+        started_tracing = False
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            frames = _memory_frames()
+            # The peak is reset to measure this call, so hand the peak reached so far to the enclosing call
+            if frames:
+                frames[-1][1] = max(frames[-1][1], peak)
+            frames.append([current, current])
+            tracemalloc.reset_peak()
 
-        begin = time.time()
-        
-        func_return_val = func(*args, **kwargs)
+        begin = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed_ns = time.perf_counter_ns() - begin
+            local.active = False
 
-        end = time.time()
-        print("Total time: ", func.__name__, end - begin)
+            peak_memory = None
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                frames = _memory_frames()
+                current_at_entry, nested_peak = frames.pop()
+                peak = max(peak, nested_peak)
+                # Only the memory allocated during the call counts, not what was allocated before it
+                peak_memory = peak - current_at_entry
+                if frames:
+                    frames[-1][1] = max(frames[-1][1], peak)
+                if started_tracing:
+                    tracemalloc.stop()
 
-        return func_return_val
+            stats.add(elapsed_ns, peak_memory)
+            if verbose:
+                print("Total time: ", func.__name__, elapsed_ns / 1e9)
 
+    wrapper.stats = stats
     return wrapper
 
+def timing_report(registry=timing_registry):
+    '''
+    Returns a table with the timing statistics of the registry, sorted by total time. Times are in milliseconds.
+    '''
+    lines = [f'{"function":<45}{"count":>8}{"total":>12}{"mean":>10}{"min":>10}{"p50":>10}{"p90":>10}{"p99":>10}{"max":>10}{"peak mem":>12}']
+    for stats in sorted(registry.values(), key=lambda stats: stats.total_ns, reverse=True):
+        if not stats.count:
+            continue
+        row = stats.as_dict()
+        ms = lambda key: f'{row[key] / 1e6:.3f}'
+        peak_memory = '' if row['peak_memory'] is None else str(row['peak_memory'])
+        lines.append(f'{stats.name:<45}{stats.count:>8}{ms("total_ns"):>12}{ms("mean_ns"):>10}{ms("min_ns"):>10}'
+                     f'{ms("p50_ns"):>10}{ms("p90_ns"):>10}{ms("p99_ns"):>10}{ms("max_ns"):>10}{peak_memory:>12}')
+    return '\n'.join(lines)
+
+def export_timings(filepath, registry=timing_registry):
+    '''
+    Writes the timing statistics of the registry to a CSV file if filepath ends with .csv, otherwise to a JSON file.
+    '''
+    rows = [stats.as_dict() for stats in registry.values()]
+    with open(filepath, 'w', newline='') as file:
+        if filepath.endswith('.csv'):
+            writer = csv.DictWriter(file, fieldnames=list(TimingStats('').as_dict()))
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump(rows, file, indent=2)
+
+class LRUCache:
+    '''
+    A dictionary based cache which holds at most maxsize items and evicts the least recently used item first.
+    Keeps count of the cache hits and misses.
+    '''
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        '''
+        Returns the cached value for key and marks it as most recently used. Returns default if key is not cached.
+        '''
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        '''
+        Caches value for key and evicts the least recently used item if the cache is full.
+        '''
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        '''
+        Returns the cache statistics as dictionary.
+        '''
+        return {'hits': self.hits, 'misses': self.misses, 'maxsize': self.maxsize, 'currsize': len(self._data)}
+
+_missing = object()
+
+def lru_memoize(maxsize=128):
+    '''
+    Decorator function that caches the results of the decorated function for the maxsize most recently used arguments.
+    The cache and its statistics are available through the cache, cache_info and cache_clear attributes of the decorated function.
+    '''
+    def decorator(func):
+        cache = LRUCache(maxsize)
+
+        @wraps(func)
+        def wrapper(*args):
+            value = cache.get(args, _missing)
+            if value is _missing:
+                value = func(*args)
+                cache.put(args, value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.info
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
+
 # Lucas number function without memoization
 def lucas(n):
     if n <= 0:
@@ -26,45 +256,197 @@ def lucas(n):
     else:
         return lucas(n - 1) + lucas(n - 2)
 
-# Dictionary that caches the results from the lucas number function
-memo_cache = {0: 2, 1: 1}
-
 # Lucas number function with memoization
+# Each number is computed once from the two cached numbers before it. The recursion still goes down to 1 on the
+# first call, so indices above a few hundred hit the recursion limit; use lucas_fast for those
+@lru_memoize(maxsize=128)
 def lucas_memo(n):
-    if n in memo_cache:
-        return memo_cache[n]
+    if n <= 0:
+        return 2
+    elif n == 1:
+        return 1
     else:
-        ret_val = lucas_memo(n - 1) + lucas_memo(n - 2)
-        memo_cache[n]  = ret_val
-        return ret_val
+        return lucas_memo(n - 1) + lucas_memo(n - 2)
 
-# This function is used as wrapper so that the decorator funciton can log the total time for calculating the lucas number instead of each recursive call
-@log_time_decorator   
-def lucas_result(n, func):
-    return func(n)
+def fibonacci_pair(n):
+    '''
+    Returns the Fibonacci numbers F(n) and F(n+1) using the fast doubling method in O(log n) steps:
+    F(2k) = F(k) * (2*F(k+1) - F(k)) and F(2k+1) = F(k)^2 + F(k+1)^2
+    '''
+    if n < 0:
+        raise ValueError('n must be a non-negative integer')
 
-def prime_factors(n):
+    f_k, f_k1 = 0, 1
+    # Walk the bits of n from the most significant one, doubling k at each step and adding one for set bits
+    for bit in bin(n)[2:]:
+        f_2k = f_k * (2 * f_k1 - f_k)
+        f_2k1 = f_k * f_k + f_k1 * f_k1
+        if bit == '1':
+            f_k, f_k1 = f_2k1, f_2k + f_2k1
+        else:
+            f_k, f_k1 = f_2k, f_2k1
+
+    return f_k, f_k1
+
+# Fibonacci number function using fast doubling
+@lru_memoize(maxsize=256)
+def fibonacci_fast(n):
+    return fibonacci_pair(n)[0]
+
+# Lucas number function using fast doubling, L(n) = 2*F(n+1) - F(n)
+@log_time_decorator
+@lru_memoize(maxsize=256)
+def lucas_fast(n):
+    f_n, f_n1 = fibonacci_pair(n)
+    return 2 * f_n1 - f_n
+
+def lucas_many(indices):
+    '''
+    Returns a list with the Lucas numbers for a sequence of indices.
+    Each distinct index is computed only once.
+    '''
+    results = {n: lucas_fast(n) for n in set(indices)}
+    return [results[n] for n in indices]
+
+# Factors below this limit are found by trial division with a table of primes
+SMALL_PRIME_LIMIT = 2**16
+
+# Miller-Rabin with these bases is deterministic for all n < 3.3 * 10^24
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+@lru_memoize(maxsize=1)
+def small_primes(limit=SMALL_PRIME_LIMIT):
+    '''
+    Returns a tuple with the primes below limit using the sieve of Eratosthenes.
+    '''
+    sieve = bytearray([1]) * limit
+    sieve[0:2] = b'\x00\x00'
+    for i in range(2, math.isqrt(limit - 1) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return tuple(i for i, is_prime in enumerate(sieve) if is_prime)
+
+def is_prime(n, rounds=8):
+    '''
+    Miller-Rabin primality test. The result is exact for n < 3.3 * 10^24, above that
+    additional random bases are tried and a composite passes with probability below 4^-rounds.
+    '''
+    if n < 2:
+        return False
+    for p in MILLER_RABIN_BASES:
+        if n % p == 0:
+            return n == p
+
+    # Write n - 1 as d * 2^s with d odd
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    bases = list(MILLER_RABIN_BASES)
+    if n >= 3_317_044_064_679_887_385_961_981:
+        bases += [random.randrange(2, n - 1) for _ in range(rounds)]
+
+    for a in bases:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+def pollard_brent(n):
+    '''
+    Returns a non-trivial factor of the odd composite number n using Brent's variant of Pollard's rho algorithm.
+    '''
+    while True:
+        y, c, m = random.randrange(1, n), random.randrange(1, n), 128
+        g, r, q = 1, 1, 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            # Multiply the differences together and take a single gcd every m steps
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = math.gcd(q, n)
+                k += m
+            r *= 2
+
+        if g == n:
+            # The batched gcd overshot, step back one value at a time
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = math.gcd(abs(x - ys), n)
+
+        if g != n:
+            return g
+
+@log_time_decorator
+@lru_memoize(maxsize=1024)
+def factorize(n):
+    '''
+    Returns a sorted tuple with the prime factors of n.
+    Small factors are removed by trial division, the remaining cofactor is split with Pollard's rho until all factors are prime.
+    Results are cached, so known factorizations are returned immediately.
+    '''
     factors = []
+    limit = SMALL_PRIME_LIMIT
 
-    while n % 2 == 0:
-        factors.append(2)
-        n = n // 2
+    for p in small_primes():
+        if p * p > n:
+            break
+        while n % p == 0:
+            factors.append(p)
+            n //= p
 
-    for i in range(3, int(n**0.5) + 1, 2):
+    composites = [n] if n > 1 else []
+    while composites:
+        m = composites.pop()
+        # Without factors below limit, a number below limit^2 must be prime
+        if m < limit * limit or is_prime(m):
+            factors.append(m)
+        else:
+            d = pollard_brent(m)
+            composites.extend((d, m // d))
 
-        while n % i == 0:
-            factors.append(i)
-            n = n // i
+    return tuple(sorted(factors))
 
-    if n > 2:
-        factors.append(n)
+def prime_factors(n):
+    return list(factorize(n))
 
-    return factors
+def factorize_many(numbers, workers=None):
+    '''
+    Returns a list with the prime factors of each number.
+    Numbers with a known factorization are taken from the cache of factorize, the others are factored
+    in a pool of worker processes if workers is given, otherwise one by one.
+    '''
+    numbers = list(numbers)
+    missing = [n for n in dict.fromkeys(numbers) if (n,) not in factorize.cache]
+
+    if missing and workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for n, factors in zip(missing, executor.map(factorize, missing)):
+                factorize.cache.put((n,), factors)
+
+    return [list(factorize(n)) for n in numbers]
 
 def main():
-    print(f'Lucas number of 35 (no memoization) is: {lucas_result(35, lucas)}')
-    print(f'Lucas number of 35 (with memoization) is: {lucas_result(35, lucas_memo)}')
-    print(f'Lucas number of 100 (with memoization) is: {lucas_result(100, lucas_memo)}')
+    # lucas and lucas_memo are decorated here rather than at their definition: their recursive calls then go to the
+    # undecorated functions and the measured time doesn't include the overhead of a wrapper call for each of them
+    timed_lucas_memo = log_time_decorator(lucas_memo)
+    print(f'Lucas number of 35 (no memoization) is: {log_time_decorator(lucas)(35)}')
+    print(f'Lucas number of 35 (with memoization) is: {timed_lucas_memo(35)}')
+    print(f'Lucas number of 100 (with memoization) is: {timed_lucas_memo(100)}')
     
     l = lucas_memo(60)
     pf = prime_factors(l)
@@ -76,6 +458,16 @@ def main():
 
     print(f'Prime factors of L(61): {l} = {'*'.join([str(prime) for prime in pf])}')
 
+    for n, pf in zip((100, 200), factorize_many([lucas_fast(100), lucas_fast(200)], workers=2)):
+        print(f'Prime factors of L({n}): {'*'.join([str(prime) for prime in pf])}')
+
+    l = lucas_fast(10**6)
+    print(f'Lucas number of 1000000 (fast doubling) has {l.bit_length()} bits')
+    print(f'Lucas numbers of 10, 20, 30 (batch): {lucas_many([10, 20, 30])}')
+    print(f'lucas_memo cache: {lucas_memo.cache_info()}')
+    print()
+    print(timing_report())
+
 if __name__ == '__main__':
     main()
 
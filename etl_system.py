@@ -1,5 +1,6 @@
 import datetime
 import json
+import math
 import random
 import sqlite3
 from typing import Optional, Any, Self
@@ -234,6 +235,10 @@ class Sink:
     -------
     write_message(self, msg: Message) -> None:
         Writes a message to a sink.
+    write_messages(self, msgs: list[Message]) -> None:
+        Writes a batch of messages to a sink.
+    flush(self) -> None:
+        Writes any buffered messages to a sink.
     '''
     def __init__(self, name) -> None:
         self.name = name
@@ -244,6 +249,15 @@ class Sink:
     def write_message(self, msg: Message) -> None:
         pass 
 
+    def write_messages(self, msgs: list[Message]) -> None:
+        '''Writes a batch of messages to a sink. By default the messages are written one by one.'''
+        for msg in msgs:
+            self.write_message(msg)
+
+    def flush(self) -> None:
+        '''Writes any buffered messages to a sink. Sinks without a buffer have nothing to do.'''
+        pass
+
 class ConsoleSink(Sink):
     '''
     A class that prints a message to a console.
@@ -286,6 +300,9 @@ class SQLiteSink(Sink):
     write_message(self, msg: Message) -> None:
         Writes a Message objects passed as argument to the table.
 
+    write_messages(self, msgs: list[Message]) -> None:
+        Writes a batch of Message objects to the table in a single transaction.
+
     cleanup_table(self)-> None:
         Deletes all previously loaded data in the table.
     '''
@@ -338,6 +355,23 @@ class SQLiteSink(Sink):
             if self.conn:
                 self._close_conn()
 
+    def write_messages(self, msgs: list[Message]) -> None:
+        '''Writes a batch of Message objects to the table in a single transaction.'''
+        if not msgs:
+            return
+        try:
+            cursor = self._open_conn()
+            cursor.executemany(
+                f'INSERT INTO {self.table_name} (id, value, ts) VALUES (?, ?, ?)',
+                [(msg.key, msg.value, str(msg.ts)) for msg in msgs]
+            )
+            self._commit()
+        except sqlite3.Error as e:
+            raise e
+        finally:
+            if self.conn:
+                self._close_conn()
+
 class SinkFactory:
     '''
     Factory class for creating Sink objects.
@@ -380,8 +414,8 @@ class ETL():
         Creates a Source object from which the ETL process to read and returns a self reference.
     sink(self, name: str, type: str, *args: Any) -> Self:
         Creates a Sink object to which the ETL process to write and returns a self reference.
-    run(self) -> None:
-        Reads a message from the Source object and writes it to the Sink object.
+    run(self, max_messages: Optional[float] = None) -> None:
+        Reads messages from the Source object and writes them to the Sink object.
     '''
     def __init__(self, src: Optional[Source] = None, tgt: Optional[Sink] = None) -> None:
         self.src = src
@@ -409,8 +443,13 @@ class ETL():
         self.tgt = SinkFactory.create_sink(name, type, *args)
         return self
     
-    def run(self) -> None:
-        '''Reads a message from the Source object and writes it to the Sink object.'''
+    def run(self, max_messages: Optional[float] = None) -> None:
+        '''
+        Reads messages from the Source object and writes them to the Sink object.
+        A finite source is read until it has no more messages, an infinite source is read max_messages times (once by default).
+        Pass math.inf as max_messages to read an infinite source until it ends.
+        Reading stops early if the source returns None. Buffered sinks are flushed at the end of the run.
+        '''
 
         if self.src is None:
             raise ValueError('No source specified')
@@ -419,9 +458,17 @@ class ETL():
             raise ValueError('No sink specified')
 
         print(f'Reading from source {self.src} and writing to sink {self.tgt}...')
-        
-        if self.src.infinite_flag:
-            self.tgt.write_message(self.src.read_message())
-        else:
-            while self.src.has_message():
-                self.tgt.write_message(self.src.read_message())
+
+        if max_messages is None:
+            max_messages = 1 if self.src.infinite_flag else math.inf
+
+        count = 0
+        try:
+            while count < max_messages and (self.src.infinite_flag or self.src.has_message()):
+                msg = self.src.read_message()
+                if msg is None:
+                    break
+                self.tgt.write_message(msg)
+                count += 1
+        finally:
+            self.tgt.flush()
@@ -1,6 +1,8 @@
 import sys
 import math
 import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 # Global variables assigned with default values
 num_permutations_to_print = 1
@@ -20,6 +22,174 @@ def generate_permutations(a, n):
         generate_permutations(a, n - 1)
 
 
+def count_distinct_permutations(word):
+    '''
+    Returns the number of distinct permutations of word, taking repeated letters into account.
+    '''
+    count = math.factorial(len(word))
+    for repeats in Counter(word).values():
+        count //= math.factorial(repeats)
+    return count
+
+def permutation_rank(word):
+    '''
+    Returns the lexicographic rank of word among the distinct permutations of its letters.
+    Repeated letters are taken into account, so the ranks go from 0 to count_distinct_permutations(word) - 1.
+    '''
+    counts = Counter(word)
+    letters = sorted(counts)
+    # Number of distinct permutations of the letters that are not placed yet
+    remaining = count_distinct_permutations(word)
+    length = len(word)
+    rank = 0
+
+    for letter in word:
+        # Skip all permutations that start with a smaller letter at this position
+        for smaller in letters:
+            if smaller == letter:
+                break
+            rank += remaining * counts[smaller] // length
+        remaining = remaining * counts[letter] // length
+        counts[letter] -= 1
+        length -= 1
+
+    return rank
+
+def permutation_unrank(word, rank):
+    '''
+    Returns the distinct permutation of the letters of word with the given lexicographic rank as list of letters.
+    '''
+    counts = Counter(word)
+    letters = sorted(counts)
+    remaining = count_distinct_permutations(word)
+    if not 0 <= rank < remaining:
+        raise ValueError(f'rank must be between 0 and {remaining - 1}')
+
+    length = len(word)
+    permutation = []
+
+    for _ in range(len(word)):
+        for letter in letters:
+            if not counts[letter]:
+                continue
+            # Number of permutations which have this letter at the current position
+            block = remaining * counts[letter] // length
+            if rank < block:
+                break
+            rank -= block
+        permutation.append(letter)
+        remaining = block
+        counts[letter] -= 1
+        length -= 1
+
+    return permutation
+
+def next_permutation(letters):
+    '''
+    Rearranges the list of letters in place into the next permutation in lexicographic order.
+    Repeated letters are handled, so each distinct permutation is produced once.
+    Returns False if letters is already the last permutation.
+    '''
+    # Find the rightmost letter which is smaller than its successor
+    i = len(letters) - 2
+    while i >= 0 and letters[i] >= letters[i + 1]:
+        i -= 1
+    if i < 0:
+        return False
+
+    # Swap it with the rightmost letter larger than it and reverse the tail
+    j = len(letters) - 1
+    while letters[j] <= letters[i]:
+        j -= 1
+    letters[i], letters[j] = letters[j], letters[i]
+    letters[i + 1:] = reversed(letters[i + 1:])
+    return True
+
+def iter_permutations(word, start=0, stop=None):
+    '''
+    Generator that yields the distinct permutations of word with ranks from start up to but not including stop
+    in lexicographic order, as lists of letters. The whole range is walked iteratively without recursion,
+    so the work can be split or resumed at any rank.
+    '''
+    total = count_distinct_permutations(word)
+    stop = total if stop is None else min(stop, total)
+    if start >= stop:
+        return
+
+    letters = permutation_unrank(word, start)
+    for _ in range(stop - start):
+        yield list(letters)
+        next_permutation(letters)
+
+def _filter_permutation_range(args):
+    '''
+    Returns the permutations in a rank range which match the predicate. Runs in a worker process.
+    '''
+    word, start, stop, predicate = args
+    matches = []
+    for letters in iter_permutations(word, start, stop):
+        permutation = ''.join(letters)
+        if predicate(permutation):
+            matches.append(permutation)
+    return matches
+
+def filter_permutations(word, predicate, workers=None, chunks_per_worker=4):
+    '''
+    Returns the distinct permutations of word which match the predicate, in lexicographic order.
+    With workers, the ranks are split into ranges which are checked in a pool of worker processes.
+    The predicate must be picklable to be sent to the workers, e.g. a module level function.
+    '''
+    total = count_distinct_permutations(word)
+    if not workers:
+        return _filter_permutation_range((word, 0, total, predicate))
+
+    chunks = workers * chunks_per_worker
+    bounds = [total * i // chunks for i in range(chunks + 1)]
+    jobs = [(word, start, stop, predicate) for start, stop in zip(bounds, bounds[1:]) if start < stop]
+
+    matches = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_matches in executor.map(_filter_permutation_range, jobs):
+            matches.extend(chunk_matches)
+    return matches
+
+def find_anagrams(word, dictionary):
+    '''
+    Returns the distinct anagrams of word which are found in a sequence of dictionary words, in lexicographic order.
+    Two words are anagrams if their sorted letters are the same, so the dictionary is scanned once
+    instead of generating the permutations of word.
+    '''
+    signature = sorted(word)
+    return sorted({w for w in dictionary if len(w) == len(word) and sorted(w) == signature})
+
+def sample_permutations(word, k, unique=False, rng=random):
+    '''
+    Generator that yields k uniformly random permutations of word as lists of letters.
+    Each permutation is drawn directly with a Fisher-Yates shuffle, so the work is O(k*n) for any word length.
+    With unique, k distinct ranks are drawn and unranked instead, so each distinct permutation is yielded
+    at most once and the generator stops early if the word has fewer than k distinct permutations.
+    '''
+    if unique:
+        total = count_distinct_permutations(word)
+        k = min(k, total)
+        if total <= sys.maxsize:
+            ranks = rng.sample(range(total), k)
+        else:
+            # range objects this large have no len(), collisions are practically impossible anyway
+            ranks = set()
+            while len(ranks) < k:
+                ranks.add(rng.randrange(total))
+        for rank in ranks:
+            yield permutation_unrank(word, rank)
+        return
+
+    letters = list(word)
+    for _ in range(k):
+        # random.shuffle is an in-place Fisher-Yates shuffle
+        rng.shuffle(letters)
+        yield list(letters)
+
+
 def main():
 
     #if len(sys.argv) != 2:
@@ -27,8 +197,9 @@ def main():
     #    sys.exit(1)
     
 
-    if len(sys.argv) != 3:
+    if len(sys.argv) not in (3, 4) or (len(sys.argv) == 4 and sys.argv[3] not in ('heap', 'sample', 'unique')):
         sys.stderr.write('Two arguments required: <word>, <approx num of prints>.\n')
+        sys.stderr.write('Optional third argument: heap (default), sample or unique.\n')
         return 1
 
 
@@ -36,6 +207,14 @@ def main():
     word = sys.argv[1]
     word_len = len(word)
     num_permutations_to_print = int(sys.argv[2])
+    mode = sys.argv[3] if len(sys.argv) == 4 else 'heap'
+
+    # Sampling modes draw the permutations directly instead of walking all of them
+    # and print exactly the requested number (or all distinct permutations in unique mode, if there are fewer)
+    if mode != 'heap':
+        for permutation in sample_permutations(word, num_permutations_to_print, unique=(mode == 'unique')):
+            print(' '.join(permutation))
+        return 0
     
     # Calculate the chance for a permutation to be printed
     # The actual number of prints is approximate to the number passed as command line argument
@@ -0,0 +1,59 @@
+import itertools
+import random
+
+from heap_algorithm import (count_distinct_permutations, filter_permutations, find_anagrams, iter_permutations,
+                            permutation_rank, permutation_unrank)
+
+def distinct_permutations(word):
+    return sorted(set(itertools.permutations(word)))
+
+def test_rank_unrank_round_trip():
+    for word in ['', 'a', 'abc', 'aab', 'banana', 'mississippi']:
+        total = count_distinct_permutations(word)
+        for rank in range(total):
+            assert permutation_rank(permutation_unrank(word, rank)) == rank
+
+def test_rank_of_long_word():
+    rng = random.Random(110)
+    word = 'supercalifragilisticexpialidocious'
+    for _ in range(100):
+        rank = rng.randrange(count_distinct_permutations(word))
+        assert permutation_rank(permutation_unrank(word, rank)) == rank
+
+def test_unrank_out_of_range():
+    for rank in (-1, count_distinct_permutations('aab')):
+        try:
+            permutation_unrank('aab', rank)
+        except ValueError:
+            pass
+        else:
+            assert False, f'rank {rank} should be rejected'
+
+def test_iter_permutations_matches_itertools():
+    for word in ['abcd', 'aabb', 'cabbage']:
+        expected = [list(permutation) for permutation in distinct_permutations(word)]
+        assert list(iter_permutations(word)) == expected
+        assert [permutation_rank(letters) for letters in iter_permutations(word)] == list(range(len(expected)))
+        assert list(iter_permutations(word, 3, 10)) == expected[3:10]
+
+def test_filter_permutations():
+    expected = [''.join(permutation) for permutation in distinct_permutations('banana') if permutation[0] == 'n']
+    assert filter_permutations('banana', lambda permutation: permutation[0] == 'n') == expected
+
+def test_find_anagrams():
+    dictionary = ['listen', 'silent', 'enlist', 'tinsel', 'inlets', 'listens', 'google', 'silent', 'Listen']
+    assert find_anagrams('listen', dictionary) == ['enlist', 'inlets', 'listen', 'silent', 'tinsel']
+    assert find_anagrams('listen', dictionary) == filter_permutations('listen', set(dictionary).__contains__)
+    assert find_anagrams('abc', dictionary) == []
+
+def test_find_anagrams_of_long_word():
+    word = 'conservationalists'
+    anagram = 'conversationalists'
+    assert find_anagrams(word, [anagram, word[::-1] + 'x', 'conservation']) == [anagram]
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f'{name} passed')
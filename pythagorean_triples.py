@@ -1,12 +1,89 @@
-#Holds Pythagorean triples count
-pt_count = 0
-
-for c in range(1, 48):
-    for b in range(1, c):
-        for a in range(1, b):
-            if a * a + b * b == c * c:
-                #print('{}, {}, {}'.format(a,b,c))
-                print('{:3d}{:3d}{:3d}'.format(a,b,c))
-                pt_count += 1
-
-print(f'Pythagorean triples count: {pt_count}')
+import math
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def primitive_triples(limit):
+    '''
+    Generator that yields the primitive Pythagorean triples (a, b, c) with a < b and c <= limit using Euclid's formula:
+    for m > n > 0 coprime and not both odd, a and b are m^2 - n^2 and 2mn, and c is m^2 + n^2.
+    '''
+    m = 2
+    while m * m + 1 <= limit:
+        # n must have the opposite parity of m, otherwise the triple is not primitive
+        for n in range(1 if m % 2 == 0 else 2, m, 2):
+            c = m * m + n * n
+            if c > limit:
+                break
+            if math.gcd(m, n) == 1:
+                a, b = m * m - n * n, 2 * m * n
+                yield (a, b, c) if a < b else (b, a, c)
+        m += 1
+
+def pythagorean_triples(limit, primitive_only=False, sort=False):
+    '''
+    Generator that yields the Pythagorean triples (a, b, c) with a < b and c <= limit.
+    Every primitive triple is followed by its multiples unless primitive_only is set.
+    With sort the triples are yielded ordered by c and b instead, which requires keeping all of them in memory.
+    '''
+    if sort:
+        yield from sorted(pythagorean_triples(limit, primitive_only), key=lambda triple: (triple[2], triple[1]))
+        return
+
+    for a, b, c in primitive_triples(limit):
+        if primitive_only:
+            yield a, b, c
+        else:
+            for k in range(1, limit // c + 1):
+                yield k * a, k * b, k * c
+
+def count_triples(limit, primitive_only=False):
+    '''
+    Returns the number of Pythagorean triples with c <= limit without generating the scaled triples:
+    a primitive triple with hypotenuse c has limit // c multiples within the limit.
+    '''
+    if primitive_only:
+        return sum(1 for _ in primitive_triples(limit))
+    return sum(limit // c for _, _, c in primitive_triples(limit))
+
+def triples_array(limit, primitive_only=False):
+    '''
+    Returns the Pythagorean triples with c <= limit as NumPy array with a row (a, b, c) per triple.
+    The triples are computed in batches, one for each value of m in Euclid's formula. Requires NumPy.
+    '''
+    if np is None:
+        raise ImportError('triples_array requires NumPy')
+
+    batches = []
+    m = 2
+    while m * m + 1 <= limit:
+        n = np.arange(1 if m % 2 == 0 else 2, m, 2, dtype=np.int64)
+        n = n[(m * m + n * n <= limit) & (np.gcd(m, n) == 1)]
+        legs = np.stack((m * m - n * n, 2 * m * n))
+        batches.append(np.column_stack((legs.min(axis=0), legs.max(axis=0), m * m + n * n)))
+        m += 1
+
+    primitives = np.concatenate(batches) if batches else np.empty((0, 3), dtype=np.int64)
+    if primitive_only or not len(primitives):
+        return primitives
+
+    # Repeat each primitive triple once for each of its multiples and scale the copies by 1, 2, 3, ...
+    multiples = limit // primitives[:, 2]
+    starts = np.cumsum(multiples) - multiples
+    k = np.arange(multiples.sum(), dtype=np.int64) - np.repeat(starts, multiples) + 1
+    return np.repeat(primitives, multiples, axis=0) * k[:, None]
+
+def main():
+    # Holds the upper bound for c, the triples up to 47 are printed by default
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 47
+
+    for a, b, c in pythagorean_triples(limit, sort=True):
+        print('{:3d}{:3d}{:3d}'.format(a, b, c))
+
+    print(f'Pythagorean triples count: {count_triples(limit)}')
+
+if __name__ == '__main__':
+    main()